@@ -2,22 +2,34 @@
 This file contains functions for plotting various pieces of data.
 
 createFeatureTimeline: create figure displaying match features available in each year to select usable features
-createHistoryPlot: plot accuracy over number of preceding seasons used to predict
+createHistoryPlot: plot accuracy over number of preceding seasons used to predict, optionally that of an ensemble
 plotResults: display information about error and estimator coefficients
+renderResults: draw the same figure without a display and save it to file, one scatter call per panel
+exportResults: save coefficients and their averages as json, for use outside this project
 
 The following are just helper functions:
     drawFeatureTimeline
     plotListOfStacks
     plotStack
+    drawStacks
+    labelTicks
     initHistoryPlot
     initResultsPlot
     initDataFromDict
     initDataFromList
+    initArraysFromDict
+    initArraysFromLists
+    summarizeDict
 """
 
 
+import itertools
+import json
+
+import matplotlib.figure as mfigure
 import matplotlib.lines as mlines
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 
 import readPLData
@@ -25,6 +37,9 @@ import readPLData
 DEFAULT_COLOR = 'b'
 ALT_COLOR = 'r'
 DOT_SIZE = 6
+FIGURE_SIZE = (16, 9)
+MAX_TICK_LABELS = 200       # beyond this, tick labels are unreadable and slow to draw
+LEGEND_LOCATION = 'upper left'  # searching for the 'best' location is slow with many points
 
 
 def createFeatureTimeline(featureList, startSeason, endSeason):
@@ -32,16 +47,19 @@ def createFeatureTimeline(featureList, startSeason, endSeason):
     # used to create USABLE_FEATURES list and FIRST_USEFUL_SEASON
     dataHeaders = dict()
     for seasonNumber in range(startSeason, endSeason + 1):
-        seasonDF = pd.read_csv(readPLData.fileFromNumber(seasonNumber))
-        seasonFeatures = seasonDF.head()
-        dataHeaders[seasonNumber] = seasonFeatures
+        # header line only; drawFeatureTimeline checks column names, not values
+        dataHeaders[seasonNumber] = pd.read_csv(readPLData.fileFromNumber(seasonNumber), nrows=0)
     drawFeatureTimeline(featureList, range(startSeason, endSeason + 1), dataHeaders)
 
 
-def createHistoryPlot(title, yVal, numXVals, stacks):
+def createHistoryPlot(title, yVal, numXVals, stacks, ensemble=None):
+    # history lengths start at 1, so the ensemble's stack takes the unused position 0
     figure, axis = initHistoryPlot(title, yVal, numXVals)
     for k, y in stacks.items():
         plotStack(axis, k, y)
+    if ensemble is not None:
+        plotStack(axis, 0, ensemble, ALT_COLOR)
+        axis.set_xticks(range(0, numXVals), ['Ensemble'] + [str(k) for k in range(1, numXVals)])
     plt.show()
 
 
@@ -63,6 +81,36 @@ def plotResults(errorDict, homeDict, awayDict, refBiasDict, statDict):
     plt.show()
 
 
+def renderResults(errorDict, homeDict, awayDict, refBiasDict, statDict, fileName):
+    # file format (png, svg, ...) is taken from the extension of fileName
+    seasonList, errorList = initDataFromList(errorDict)
+    teamList, homeX, homeY, homeMeans = initArraysFromDict(homeDict)
+    awayX, awayY, awayMeans = initArraysFromLists([awayDict[team] for team in teamList])
+    refList, refX, refY, refMeans = initArraysFromDict(refBiasDict)
+    statList, statX, statY, statMeans = initArraysFromDict(statDict)
+
+    fig, axes = initResultsPlot(seasonList, teamList, refList, statList, mfigure.Figure(figsize=FIGURE_SIZE))
+    axes[0, 0].plot(seasonList, errorList)
+    drawStacks(axes[0, 1], [homeX, awayX], [homeY, -awayY], [homeMeans, -awayMeans], [DEFAULT_COLOR, ALT_COLOR])
+    drawStacks(axes[1, 0], [statX], [statY], [statMeans], [DEFAULT_COLOR])
+    drawStacks(axes[1, 1], [refX], [refY], [refMeans], [DEFAULT_COLOR])
+
+    fig.subplots_adjust(left=0.05, right=0.95, bottom=0.15, top=0.95, hspace=0.5)
+    fig.savefig(fileName)
+
+
+def exportResults(errorDict, homeDict, awayDict, refBiasDict, statDict, fileName):
+    # coefficients are stored as read, i.e. away coefficients are not negated as they are in the plot
+    seasonList, errorList = initDataFromList(errorDict)
+    data = {'errors': [{'season': season, 'error': error} for season, error in zip(seasonList, errorList)],
+            'homeTeams': summarizeDict(homeDict),
+            'awayTeams': summarizeDict(awayDict),
+            'referees': summarizeDict(refBiasDict),
+            'stats': summarizeDict(statDict)}
+    with open(fileName, 'w') as jsonFile:
+        json.dump(data, jsonFile, indent=1)
+
+
 def drawFeatureTimeline(featureList, seasonList, dataHeaders):
     # plot features available in each season, in order to select usable features
     # dataHeaders is dict from season number to header of corresponding data file
@@ -90,6 +138,20 @@ def plotStack(axis, x, yList, color=DEFAULT_COLOR):
     axis.scatter([x], [sum(yList) / len(yList)], marker='*', c=color)
 
 
+def drawStacks(axis, xArrays, yArrays, meanArrays, colors):
+    # one scatter call per group of stacks; a single colour per call lets matplotlib draw all markers at once
+    for x, y, means, color in zip(xArrays, yArrays, meanArrays, colors):
+        axis.scatter(x, y, marker='.', c=color, s=DOT_SIZE)
+        axis.scatter(np.arange(len(means)), means, marker='*', c=color)
+
+
+def labelTicks(axis, labels):
+    if len(labels) <= MAX_TICK_LABELS:
+        axis.set_xticks(range(len(labels)), labels, rotation='vertical')
+    else:
+        axis.set_xlabel('%d entries, sorted by average' % len(labels))
+
+
 def initHistoryPlot(plotTitle, yTitle, maxX):
     fig, ax = plt.subplots()
     fig.suptitle(plotTitle + ' Accuracy')
@@ -100,14 +162,18 @@ def initHistoryPlot(plotTitle, yTitle, maxX):
     return fig, ax
 
 
-def initResultsPlot(seasons, teams, refs, stats):
-    f, a = plt.subplots(nrows=2, ncols=2, gridspec_kw={'width_ratios': [3, 7]})
+def initResultsPlot(seasons, teams, refs, stats, figure=None):
+    # draws on the given figure if there is one, otherwise on a new pyplot figure
+    if figure is None:
+        f, a = plt.subplots(nrows=2, ncols=2, gridspec_kw={'width_ratios': [3, 7]})
+    else:
+        f, a = figure, figure.subplots(nrows=2, ncols=2, gridspec_kw={'width_ratios': [3, 7]})
     f.suptitle('Results', fontweight='bold')
 
     a[0, 0].set(title='Mean-Squared Error', xticks=seasons, xlabel='Season')
 
     a[0, 1].set(title='Team Results')
-    a[0, 1].set_xticks(range(len(teams)), teams, rotation='vertical')
+    labelTicks(a[0, 1], teams)
     homeListPatch = mlines.Line2D([], [], color=DEFAULT_COLOR, marker='.', linestyle='None',
                                   label='Home win coefficients')
     homeAveragePatch = mlines.Line2D([], [], color=DEFAULT_COLOR, marker='*', linestyle='None',
@@ -116,19 +182,19 @@ def initResultsPlot(seasons, teams, refs, stats):
                                   label='Away win coefficients')
     awayAveragePatch = mlines.Line2D([], [], color=ALT_COLOR, marker='*', linestyle='None',
                                      label='Average away win coefficient')
-    a[0, 1].legend(handles=[homeListPatch, homeAveragePatch, awayListPatch, awayAveragePatch])
+    a[0, 1].legend(handles=[homeListPatch, homeAveragePatch, awayListPatch, awayAveragePatch], loc=LEGEND_LOCATION)
 
     a[1, 0].set(title='Other Statistics')
-    a[1, 0].set_xticks(range(len(stats)), stats, rotation='vertical')
+    labelTicks(a[1, 0], stats)
     statListPatch = mlines.Line2D([], [], color=DEFAULT_COLOR, marker='.', linestyle='None', label='Coefficients')
     statAveragePatch = mlines.Line2D([], [], color=DEFAULT_COLOR, marker='*', linestyle='None', label='Average')
-    a[1, 0].legend(handles=[statListPatch, statAveragePatch])
+    a[1, 0].legend(handles=[statListPatch, statAveragePatch], loc=LEGEND_LOCATION)
 
     a[1, 1].set(title='Referee Bias Toward Home Team')
-    a[1, 1].set_xticks(range(len(refs)), refs, rotation='vertical')
+    labelTicks(a[1, 1], refs)
     refListPatch = mlines.Line2D([], [], color=DEFAULT_COLOR, marker='.', linestyle='None', label='Coefficients')
     refAveragePatch = mlines.Line2D([], [], color=DEFAULT_COLOR, marker='*', linestyle='None', label='Average')
-    a[1, 1].legend(handles=[refListPatch, refAveragePatch])
+    a[1, 1].legend(handles=[refListPatch, refAveragePatch], loc=LEGEND_LOCATION)
 
     return f, a
 
@@ -143,3 +209,27 @@ def initDataFromDict(dictionary):
 def initDataFromList(data):
     tuple1, tuple2 = zip(*data)
     return list(tuple1), list(tuple2)
+
+
+def initArraysFromDict(dictionary):
+    # like initDataFromDict, but values are flattened into arrays of x positions and y values
+    keys = list(dictionary.keys())
+    x, y, means = initArraysFromLists([dictionary[k] for k in keys])
+    order = np.argsort(means, kind='stable')
+    positions = np.empty_like(order)
+    positions[order] = np.arange(len(order))
+    return [keys[i] for i in order], positions[x], y, means[order]
+
+
+def initArraysFromLists(valueLists):
+    # the i-th list is placed at x = i
+    lengths = np.fromiter(map(len, valueLists), dtype=int, count=len(valueLists))
+    x = np.repeat(np.arange(len(valueLists)), lengths)
+    y = np.fromiter(itertools.chain.from_iterable(valueLists), dtype=float, count=lengths.sum())
+    means = np.bincount(x, weights=y, minlength=len(valueLists)) / lengths
+    return x, y, means
+
+
+def summarizeDict(dictionary):
+    keys, x, y, means = initArraysFromDict(dictionary)
+    return [{'name': k, 'average': m, 'coefficients': dictionary[k]} for k, m in zip(keys, means.tolist())]
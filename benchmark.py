@@ -0,0 +1,162 @@
+"""
+This file contains timing checks for the slower parts of the project, run against synthetic data.
+Each check prints its elapsed time next to a budget, so that regressions are easy to spot.
+It also contains a correctness check for results which are otherwise hard to judge by eye.
+
+benchmarkImport: time importing a module in a fresh interpreter
+benchmarkSimulation: time simulating a full season many times
+benchmarkRendering: time saving the results figure for thousands of teams and referees
+benchmarkOdds: time deriving odds features from a wide season file
+checkImportance: check that permutation importance finds the one feature which decides the result
+runBenchmarks: run all checks, report whether each is within budget
+
+The following are just helper functions:
+    syntheticFixtures
+    syntheticCoefficients
+    syntheticOddsFile
+    reportTiming
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import seasonSimulator
+
+NUM_TEAMS = 20
+NUM_SIMULATIONS = 100000
+SIMULATION_BUDGET = 10.0        # seconds
+IMPORT_BUDGET = 0.2             # seconds
+NUM_ENTITIES = 3000
+NUM_SEASONS = 20
+RENDERING_BUDGET = 1.5          # seconds
+NUM_MATCHES = 7600              # twenty seasons of matches
+NUM_OTHER_COLUMNS = 100         # columns which are not 1X2 odds of a bookmaker
+ODDS_BUDGET = 0.5               # seconds
+NUM_IMPORTANCE_ROWS = 2000
+HEAVY_MODULES = ['matplotlib', 'numpy', 'pandas', 'sklearn']
+
+
+def benchmarkImport(moduleName):
+    # returns import time and list of heavy modules loaded as a side effect
+    script = ("import sys, time\n"
+              "startTime = time.perf_counter()\n"
+              "import %s\n"
+              "print(time.perf_counter() - startTime)\n"
+              "print(','.join(m for m in %r if m in sys.modules))" % (moduleName, HEAVY_MODULES))
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+    elapsed, loaded = output.splitlines()
+    return float(elapsed), [m for m in loaded.split(',') if m]
+
+
+def benchmarkSimulation(numSimulations):
+    homeIdx, awayIdx = syntheticFixtures(NUM_TEAMS)
+    rng = np.random.default_rng(0)
+    predictedDiffs = rng.normal(0.3, 0.8, size=len(homeIdx))
+
+    startTime = time.perf_counter()
+    seasonSimulator.simulateSeasons(homeIdx, awayIdx, NUM_TEAMS, predictedDiffs, 1.2, numSimulations, seed=0)
+    return time.perf_counter() - startTime
+
+
+def benchmarkRendering(numEntities, numSeasons):
+    import art
+
+    rng = np.random.default_rng(0)
+    errors = [(season, e) for season, e in enumerate(rng.normal(1.3, 0.1, numSeasons))]
+    homeDict = syntheticCoefficients(rng, 'Team', numEntities, numSeasons)
+    awayDict = syntheticCoefficients(rng, 'Team', numEntities, numSeasons)
+    refDict = syntheticCoefficients(rng, 'Referee', numEntities, numSeasons)
+    statDict = syntheticCoefficients(rng, 'Stat', 20, numSeasons)
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        startTime = time.perf_counter()
+        art.renderResults(errors, homeDict, awayDict, refDict, statDict, os.path.join(tempDir, 'results.png'))
+        return time.perf_counter() - startTime
+
+
+def benchmarkOdds(numMatches, numOtherColumns):
+    import bookmakerOdds
+    import interpretFeatures
+
+    bookmakerColumns = interpretFeatures.getBookmakerColumns('featureDictionary.csv', ['Max', 'Avg', 'BbMx', 'BbAv'])
+    with tempfile.TemporaryDirectory() as tempDir:
+        fileName = os.path.join(tempDir, 'odds.csv')
+        syntheticOddsFile(fileName, bookmakerColumns, numMatches, numOtherColumns)
+        startTime = time.perf_counter()
+        bookmakers, odds = bookmakerOdds.readOdds(fileName, bookmakerColumns)
+        bookmakerOdds.consensusFeatures(odds)
+        return time.perf_counter() - startTime
+
+
+def checkImportance(numRows):
+    # the result is decided by the first feature; the other two are noise
+    # features are far from unit scale, so scoring data the pipeline has already scaled would give no importance
+    import pandas as pd
+    import learningUtil
+
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(scale=100, size=(numRows, 3)), columns=['Decisive', 'Noise1', 'Noise2'])
+    Y = np.sign(np.round(X['Decisive'] / 100))
+    half = numRows // 2
+    results = learningUtil.neuralNetworkPipeline(X[:half], Y[:half], X[half:], Y[half:], [(20,)], ['logistic'],
+                                                 [1e-4], 3, False, 5, list(X.columns), [])
+    importances = results[3][0]
+    passed = importances[0] > max(importances[1:])
+    print("Importance of decisive feature: %.3f, of noise: %.3f and %.3f %s"
+          % (importances[0], importances[1], importances[2], 'OK' if passed else 'FAILED'))
+    return passed
+
+
+def runBenchmarks():
+    importTime, loadedModules = benchmarkImport('main')
+    results = [reportTiming('Import main', importTime, IMPORT_BUDGET),
+               reportTiming('Simulate %d seasons' % NUM_SIMULATIONS, benchmarkSimulation(NUM_SIMULATIONS),
+                            SIMULATION_BUDGET),
+               reportTiming('Render %d teams and referees' % NUM_ENTITIES,
+                            benchmarkRendering(NUM_ENTITIES, NUM_SEASONS), RENDERING_BUDGET),
+               reportTiming('Odds features of %d matches' % NUM_MATCHES,
+                            benchmarkOdds(NUM_MATCHES, NUM_OTHER_COLUMNS), ODDS_BUDGET)]
+    results.append(checkImportance(NUM_IMPORTANCE_ROWS))
+    if loadedModules:
+        print("Importing main also loaded: %s" % ', '.join(loadedModules))
+        results.append(False)
+    return all(results)
+
+
+def syntheticFixtures(numTeams):
+    # double round robin: every team plays every other team once at home and once away
+    homeIdx, awayIdx = np.nonzero(~np.eye(numTeams, dtype=bool))
+    return homeIdx, awayIdx
+
+
+def syntheticCoefficients(rng, prefix, numEntities, numSeasons):
+    return {'%s %d' % (prefix, i): list(rng.normal(0, 0.05, numSeasons)) for i in range(numEntities)}
+
+
+def syntheticOddsFile(fileName, bookmakerColumns, numMatches, numOtherColumns):
+    # every bookmaker of the catalog prices every match, with a margin of a few percent
+    rng = np.random.default_rng(0)
+    columns = dict()
+    for bookmaker, oddsColumns in bookmakerColumns.items():
+        probabilities = rng.dirichlet([3, 2, 2], numMatches) * rng.uniform(1.02, 1.08, (numMatches, 1))
+        for k in range(3):
+            columns[oddsColumns[k]] = np.round(1 / probabilities[:, k], 2)
+    for i in range(numOtherColumns):
+        columns['Other%d' % i] = rng.integers(0, 20, numMatches)
+    np.savetxt(fileName, np.column_stack(list(columns.values())), fmt='%g', delimiter=',',
+               header=','.join(columns), comments='')
+
+
+def reportTiming(name, elapsed, budget):
+    withinBudget = elapsed <= budget
+    print("%s: %.3fs (budget %.1fs) %s" % (name, elapsed, budget, 'OK' if withinBudget else 'OVER BUDGET'))
+    return withinBudget
+
+
+if __name__ == '__main__':
+    runBenchmarks()
@@ -0,0 +1,73 @@
+"""
+This file contains methods for deriving match features from bookmaker odds.
+
+Season files carry home win, draw and away win odds from many bookmakers, in three columns per bookmaker. Only those
+columns are read, into an array of shape (matches, bookmakers, 3), and every feature is computed from that array
+at once, so the wide dataframe of the whole file is never built.
+
+readOdds: read 1X2 odds of every bookmaker present in a file into a float32 array
+consensusFeatures: get consensus probabilities, overround and disagreement of bookmakers for each match
+seasonOddsFeatures: get dataframe of odds features for a season, indexed by row position in the file
+
+The following are just helper functions:
+    impliedProbabilities
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import readPLData
+
+ODDS_FEATURE_NAMES = ['OddsHome', 'OddsDraw', 'OddsAway', 'OddsOverround', 'OddsSpread']
+
+seasonFeatures = dict()     # file name -> (modification time, size, dataframe), so each file is read once per run
+
+
+def readOdds(fileName, bookmakerColumns):
+    # bookmakerColumns maps bookmaker to its [home, draw, away] columns, as given by interpretFeatures
+    # returns bookmakers present in the file and their odds; missing or malformed odds are NaN
+    header = pd.read_csv(fileName, nrows=0).columns
+    bookmakers = [b for b, columns in bookmakerColumns.items() if all(c in header for c in columns)]
+    columns = [c for b in bookmakers for c in bookmakerColumns[b]]
+
+    oddsDF = pd.read_csv(fileName, usecols=columns)
+    odds = oddsDF[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+    return bookmakers, odds.reshape(odds.shape[0], len(bookmakers), 3)
+
+
+def consensusFeatures(odds):
+    # returns float32 array with one column per name in ODDS_FEATURE_NAMES:
+    # mean over bookmakers of normalized home/draw/away probabilities, mean overround,
+    # and standard deviation over bookmakers of the home probability; NaN where no bookmaker priced the match
+    probabilities, overround = impliedProbabilities(odds)
+    priced = ~np.isnan(overround)
+    numPriced = priced.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalized = np.where(priced[:, :, None], probabilities / overround[:, :, None], 0)
+        consensus = normalized.sum(axis=1) / numPriced[:, None]
+        meanOverround = np.where(priced, overround, 0).sum(axis=1) / numPriced
+        homeDeviation = np.where(priced, normalized[:, :, 0] - consensus[:, [0]], 0)
+        spread = np.sqrt((homeDeviation ** 2).sum(axis=1) / numPriced)
+
+    return np.column_stack([consensus, meanOverround, spread]).astype(np.float32)
+
+
+def seasonOddsFeatures(seasonNumber, bookmakerColumns):
+    fileName = readPLData.fileFromNumber(seasonNumber)
+    stat = os.stat(fileName)
+    if fileName not in seasonFeatures or seasonFeatures[fileName][:2] != (stat.st_mtime_ns, stat.st_size):
+        bookmakers, odds = readOdds(fileName, bookmakerColumns)
+        featureDF = pd.DataFrame(consensusFeatures(odds), columns=ODDS_FEATURE_NAMES)
+        seasonFeatures[fileName] = (stat.st_mtime_ns, stat.st_size, featureDF)
+    return seasonFeatures[fileName][2]
+
+
+def impliedProbabilities(odds):
+    # decimal odds of d imply probability 1/d; overround is the sum over outcomes, i.e. 1 plus the bookmaker's margin
+    # a bookmaker missing any of the three odds of a match has NaN overround for that match
+    with np.errstate(divide='ignore'):
+        probabilities = np.where(odds > 1, 1 / odds, np.nan)
+    return probabilities, probabilities.sum(axis=2)
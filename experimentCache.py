@@ -0,0 +1,79 @@
+"""
+This file contains methods for caching the outcome of each training/testing window on disk.
+
+A window is identified by a hash of everything that determines its outcome: the contents of its season files,
+the referee names and encoder settings used to build the one-hot vocabulary, the model type, the hyperparameter
+grid and CACHE_VERSION. Reruns skip windows whose key is already stored, and editing one season file only
+invalidates the windows which read it.
+
+windowKey: get hash identifying a window
+loadWindow: get stored outcome of a window, or None if it has not been computed
+storeWindow: save outcome of a window
+
+The following are just helper functions:
+    fileHash
+    windowFileName
+    toSerializable
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import readPLData
+
+CACHE_DIRECTORY = 'cache/windows'
+CACHE_VERSION = 1           # increase whenever what learnSeasons returns, or how it is computed, changes
+
+fileHashes = dict()         # file name -> (modification time, size, hash), so each file is read once per run
+
+
+def windowKey(seasonsToTrain, seasonsToTest, refDict, encoderSettings, modelType, hyperparameters):
+    hasher = hashlib.sha256()
+    for season in list(seasonsToTrain) + list(seasonsToTest):
+        hasher.update(fileHash(readPLData.fileFromNumber(season)).encode())
+    settings = [CACHE_VERSION, list(seasonsToTrain), list(seasonsToTest), sorted(refDict.items()), encoderSettings,
+                modelType, hyperparameters]
+    hasher.update(json.dumps(settings, default=toSerializable).encode())
+    return hasher.hexdigest()
+
+
+def loadWindow(key):
+    try:
+        with open(windowFileName(key)) as jsonFile:
+            return json.load(jsonFile)
+    except FileNotFoundError:
+        return None
+
+
+def storeWindow(key, outcome):
+    # write to a temporary file first, so an interrupted run never leaves a partial entry behind
+    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+    fileDescriptor, tempName = tempfile.mkstemp(dir=CACHE_DIRECTORY, suffix='.tmp')
+    try:
+        with os.fdopen(fileDescriptor, 'w') as jsonFile:
+            json.dump(outcome, jsonFile, default=toSerializable)
+        os.replace(tempName, windowFileName(key))
+    except BaseException:
+        os.remove(tempName)
+        raise
+
+
+def fileHash(fileName):
+    stat = os.stat(fileName)
+    if fileName not in fileHashes or fileHashes[fileName][:2] != (stat.st_mtime_ns, stat.st_size):
+        with open(fileName, 'rb') as dataFile:
+            fileHashes[fileName] = (stat.st_mtime_ns, stat.st_size, hashlib.sha256(dataFile.read()).hexdigest())
+    return fileHashes[fileName][2]
+
+
+def windowFileName(key):
+    return os.path.join(CACHE_DIRECTORY, key + '.json')
+
+
+def toSerializable(value):
+    # numpy arrays and scalars become lists and numbers; anything else is stored by its string
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
@@ -3,6 +3,7 @@ This file contains instructions for dealing with feature names as stored in data
 
 buildInterpreter: builds dictionary to translate feature abbreviations into names
 getMatchFeatures: get list of features, excluding bookmaker numbers
+getBookmakerColumns: get home win, draw and away win odds columns of each bookmaker, excluding closing odds
 
 The following are helper functions to complete the csv file containing the feature dictionary.
     findUnknownAbbreviations, printUnknownAbbreviations (from data files)
@@ -38,6 +39,26 @@ def getMatchFeatures(csvfile, numMatchFeatures):
     return matchFeatures
 
 
+def getBookmakerColumns(csvfile, aggregatePrefixes):
+    # bookmaker features are flagged by a third field of 1; a bookmaker's 1X2 odds are the flagged abbreviations
+    # sharing a prefix and ending in H, D and A, e.g. B365H, B365D and B365A
+    # market maximums and averages are not bookmakers, so prefixes starting with any of aggregatePrefixes are skipped
+    with open(csvfile) as csvfile:
+        featureReader = csv.reader(csvfile, delimiter='=')
+        flagged = [row[0].strip() for row in featureReader if len(row) > 2 and row[2].strip() == '1']
+    bookmakerColumns = dict()
+    for abbrev in flagged:
+        prefix = abbrev[:-1]
+        if abbrev.endswith('H') and prefix + 'D' in flagged and prefix + 'A' in flagged \
+                and not prefix.startswith(tuple(aggregatePrefixes)):
+            bookmakerColumns[prefix] = [prefix + 'H', prefix + 'D', prefix + 'A']
+    # closing odds (e.g. B365CH, B365CD, B365CA) are the same bookmaker's prices at kick-off, not another bookmaker
+    closing = [prefix for prefix in bookmakerColumns if prefix.endswith('C') and prefix[:-1] in bookmakerColumns]
+    for prefix in closing:
+        del bookmakerColumns[prefix]
+    return bookmakerColumns
+
+
 def findUnknownAbbreviations(csvfile, featureDict):
     with open(csvfile) as csvfile:
         featureReader = csv.DictReader(csvfile)
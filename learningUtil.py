@@ -1,14 +1,32 @@
 """
 This file contains machine learning methods.
 
-neuralNetworkPipeline: run grid search with multilayer perceptron classifier and scaler
-svmPipeline: run grid search with epsilon-support vector regression and scaler
-recordResults: save error and estimator coefficients for svm to csv
+neuralNetworkPipeline: run grid search with multilayer perceptron classifier and scaler, optionally feature importances;
+    also returns predicted class probabilities of the test set
+neuralNetworkSearch: fit grid search with multilayer perceptron classifier and scaler, return fitted search
+svmPipeline: run grid search with epsilon-support vector regression and scaler, optionally bootstrap coefficients;
+    also returns predictions for the test set
+svmSearch: fit grid search with epsilon-support vector regression and scaler, return fitted search
+residualSpread: standard deviation of cross-validated residuals of an estimator on its training data
+bootstrapCoefficients: refit estimator on resampled training sets in parallel, return coefficient quantiles
+permutationImportance: drop in accuracy when groups of columns are permuted, given per column
+fitBlender: fit non-negative linear weights combining test predictions of several models over several seasons
+blendedScore: score blended predictions of several models for one season
+walkForward: step through a season in date order, refitting on all matches so far and scoring the next block
+recordResults: save error and estimator coefficients to csv, replacing earlier results for the same season
+recordBacktest: save per-step scores of a walk-forward backtest to csv, replacing earlier steps for the same season
+    and model
+recordBootstrap: save coefficient quantiles to csv, replacing earlier quantiles for the same season
 readResults: read csv file of results, produce dictionaries of coefficients
 createLayerList: create list of possible layer arrangements for neural network
 interpretGoal: get function parameters for the sake of classification or regression
 
 The following are just helper functions:
+    initWorker
+    fitResamples
+    featureGroups
+    scorePermutations
+    stackPredictions
     addCoefficient
     printPipelineDetails
     iterateLayers
@@ -16,66 +34,280 @@ The following are just helper functions:
 
 """
 
+import concurrent.futures
+import copy
 import csv
 import itertools
+import os
 import sys
 
-from sklearn import metrics
-from sklearn import model_selection
-from sklearn import neural_network
-from sklearn import pipeline
-from sklearn import preprocessing
-from sklearn import svm
+BOOTSTRAP_CHUNKS_PER_WORKER = 4
+MAX_BATCH_ROWS = 200000         # rows passed to a single predict_proba call when computing importances
+CLASSES = [-1, 0, 1]            # signs of goal differential, in the column order of MLPClassifier.predict_proba
 
+workerData = dict()         # estimator and data, set once in each worker process of a parallel computation
+
+
+def neuralNetworkPipeline(X_train, Y_train, X_test, Y_test, layers, actFns, alphas, crossVal, verbose,
+                          numRepeats=0, featureNames=None, oneHotColumns=None):
+    # with numRepeats > 0, also returns permutation importances in the shape of svm coefficients (otherwise None)
+    from sklearn import metrics
+
+    search = neuralNetworkSearch(X_train, Y_train, layers, actFns, alphas, crossVal)
+
+    if verbose:
+        printPipelineDetails(search, X_test, Y_test)
+
+    probabilities = search.predict_proba(X_test)
+    accuracy = metrics.accuracy_score(y_true=Y_test, y_pred=search.classes_[probabilities.argmax(axis=1)])
+
+    importances = None
+    if numRepeats > 0:
+        importances = permutationImportance(search.best_estimator_, X_test, Y_test, featureNames, oneHotColumns,
+                                            numRepeats)
+
+    return accuracy, -1, search.best_estimator_.named_steps['nn'].get_params(), importances, probabilities
+
+
+def neuralNetworkSearch(X_train, Y_train, layers, actFns, alphas, crossVal):
+    from sklearn import model_selection
+    from sklearn import neural_network
+    from sklearn import pipeline
+    from sklearn import preprocessing
 
-def neuralNetworkPipeline(X_train, Y_train, X_test, Y_test, layers, actFns, alphas, crossVal, verbose):
     pipe = pipeline.Pipeline([('sc', preprocessing.StandardScaler()), ('nn', neural_network.MLPClassifier())])
     params = {'nn__hidden_layer_sizes': layers,
               'nn__activation': actFns,
               'nn__alpha': alphas,
-              'sc__copy': [False],
+              'sc__copy': [True],         # scaling in place would alter the caller's data, which is used again
               'sc__with_mean': [False]}
     search = model_selection.GridSearchCV(estimator=pipe, param_grid=params, cv=crossVal, n_jobs=-1)
     search.fit(X_train, Y_train)
+    return search
+
+
+def svmPipeline(X_train, Y_train, X_test, Y_test, kernels, polyDegrees, kTerms, regTerms, epTerms, crossVal, verbose,
+                numResamples=0, quantiles=None):
+    # with numResamples > 0, also returns bootstrap quantiles of the coefficients (otherwise None)
+    from sklearn import metrics
+
+    search = svmSearch(X_train, Y_train, kernels, polyDegrees, kTerms, regTerms, epTerms, crossVal)
 
     if verbose:
         printPipelineDetails(search, X_test, Y_test)
 
-    accuracy = metrics.accuracy_score(y_true=Y_test, y_pred=search.predict(X_test))
+    Y_predicted = search.predict(X_test)
+    mse = metrics.mean_squared_error(Y_test, Y_predicted)
+
+    coefficientQuantiles = None
+    if numResamples > 0:
+        coefficientQuantiles = bootstrapCoefficients(search.best_estimator_, X_train, Y_train, numResamples, quantiles)
+
+    return (search.score(X_test, Y_test), mse, search.best_estimator_.named_steps['svm'].coef_, coefficientQuantiles,
+            Y_predicted)
 
-    return accuracy, -1, search.best_estimator_.named_steps['nn'].get_params()
 
+def svmSearch(X_train, Y_train, kernels, polyDegrees, kTerms, regTerms, epTerms, crossVal):
+    from sklearn import model_selection
+    from sklearn import pipeline
+    from sklearn import preprocessing
+    from sklearn import svm
 
-def svmPipeline(X_train, Y_train, X_test, Y_test, kernels, polyDegrees, kTerms, regTerms, epTerms, crossVal, verbose):
     pipe = pipeline.Pipeline(steps=[('sc', preprocessing.StandardScaler()), ('svm', svm.SVR())])
     params = {'svm__kernel': kernels,
               'svm__degree': polyDegrees,
               'svm__coef0': kTerms,
               'svm__C': regTerms,
               'svm__epsilon': epTerms,
-              'sc__copy': [False],
+              'sc__copy': [True],         # scaling in place would alter the caller's data, which is used again
               'sc__with_mean': [False]}
     search = model_selection.GridSearchCV(estimator=pipe, param_grid=params, cv=crossVal, n_jobs=-1)
     search.fit(X_train, Y_train)
-
-    if verbose:
-        printPipelineDetails(search, X_test, Y_test)
-
-    Y_predicted = search.predict(X_test)
-    mse = metrics.mean_squared_error(Y_test, Y_predicted)
-
-    return search.score(X_test, Y_test), mse, search.best_estimator_.named_steps['svm'].coef_
-
-
-def recordResults(seasonNumber, mse, featureNames, featureCoefficients, fileName):
-    with open(fileName, 'a') as csvfile:
-        csvfile.write('Predictions for season %d\n' % seasonNumber)
-        csvfile.write('Mean squared error: %f\n' % mse)
-        for i in range(len(featureNames)):
-            feature = featureNames[i]
-            coefficient = featureCoefficients[0][i]
-            csvfile.write("%s,%s\n" % (feature, coefficient))
-        csvfile.write('\n')
+    return search
+
+
+def residualSpread(estimator, X_train, Y_train, crossVal):
+    # every residual comes from a fold the estimator was not fitted on, so the spread is not understated
+    import numpy as np
+    from sklearn import model_selection
+
+    predicted = model_selection.cross_val_predict(estimator, X_train, Y_train, cv=crossVal, n_jobs=-1)
+    return np.sqrt(np.mean((np.asarray(Y_train) - predicted) ** 2))
+
+
+def bootstrapCoefficients(estimator, X_train, Y_train, numResamples, quantiles, seed=None, numWorkers=None):
+    # resample indices are drawn as one (numResamples, numSamples) array and split into chunks for the workers;
+    # the training data is sent to each worker once, when it starts, rather than with every chunk
+    import numpy as np
+
+    X = np.asarray(X_train, dtype=float)
+    Y = np.asarray(Y_train, dtype=float)
+    resamples = np.random.default_rng(seed).integers(0, len(Y), size=(numResamples, len(Y)))
+
+    if numWorkers is None:
+        numWorkers = os.cpu_count()
+    chunks = np.array_split(resamples, min(numResamples, numWorkers * BOOTSTRAP_CHUNKS_PER_WORKER))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=numWorkers, initializer=initWorker,
+                                                initargs=(estimator, X, Y)) as executor:
+        coefficients = np.concatenate(list(executor.map(fitResamples, chunks)))
+
+    return np.quantile(coefficients, quantiles, axis=0)
+
+
+def permutationImportance(estimator, X_test, Y_test, featureNames, oneHotColumns, numRepeats, seed=None,
+                          numWorkers=None):
+    # one-hot columns of the same original column (e.g. all HomeTeam_* columns) are permuted together;
+    # each column's importance is the average drop in accuracy, over the rows where it is active (one-hot columns)
+    # or over all rows (other columns), when its group is permuted
+    import numpy as np
+
+    X = np.array(X_test, dtype=float)         # a copy, so nothing done to the caller's frame can reach the scores
+    Y = np.asarray(Y_test)
+    groups, columnGroups, isOneHot = featureGroups(featureNames, oneHotColumns)
+
+    # every (group, repeat) pair is one job with its own row permutation; jobs are batched into chunks so that
+    # each predict_proba call scores many permuted copies of the test set at once
+    rng = np.random.default_rng(seed)
+    jobGroups = np.repeat(np.arange(len(groups)), numRepeats)
+    permutations = rng.permuted(np.tile(np.arange(len(Y)), (len(jobGroups), 1)), axis=1)
+    # about one chunk per worker, so the jobs are spread over all processors, but never more than MAX_BATCH_ROWS rows
+    numProcessors = os.cpu_count() if numWorkers is None else numWorkers
+    jobsPerChunk = max(1, min(-(-len(jobGroups) // numProcessors), MAX_BATCH_ROWS // len(Y)))
+    chunks = [(jobGroups[i:i + jobsPerChunk], permutations[i:i + jobsPerChunk])
+              for i in range(0, len(jobGroups), jobsPerChunk)]
+
+    if numWorkers is None:
+        numWorkers = min(os.cpu_count(), len(chunks))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=numWorkers, initializer=initWorker,
+                                                initargs=(estimator, X, Y, groups)) as executor:
+        permutedCorrect = np.concatenate(list(executor.map(scorePermutations, *zip(*chunks))))
+
+    correct = estimator.classes_[np.argmax(estimator.predict_proba(X.copy()), axis=1)] == Y
+    drops = correct.astype(float) - permutedCorrect
+    drops = drops.reshape(len(groups), numRepeats, len(Y)).mean(axis=1)
+
+    weights = np.where(isOneHot, X > 0, True).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        importances = (drops[columnGroups] * weights.T).sum(axis=1) / weights.sum(axis=0)
+    return np.nan_to_num(importances)[np.newaxis, :]
+
+
+def fitBlender(predictionLists, labelLists, classification):
+    # predictionLists holds, for each season, a list of test predictions with one entry per model;
+    # weights are fitted on all seasons at once, and are non-negative so that no model is bet against
+    import numpy as np
+    from sklearn import linear_model
+
+    stacked = [stackPredictions(predictions, labels, classification)
+               for predictions, labels in zip(predictionLists, labelLists)]
+    blender = linear_model.LinearRegression(positive=True, fit_intercept=not classification)
+    blender.fit(np.concatenate([X for X, Y in stacked]), np.concatenate([Y for X, Y in stacked]))
+    return blender
+
+
+def blendedScore(blender, predictions, labels, classification):
+    # score as in the pipelines: accuracy for classification, coefficient of determination for regression
+    import numpy as np
+    from sklearn import metrics
+
+    X, Y = stackPredictions(predictions, labels, classification)
+    blended = blender.predict(X)
+    if classification:
+        predictedClasses = np.array(CLASSES)[blended.reshape(-1, len(CLASSES)).argmax(axis=1)]
+        return metrics.accuracy_score(y_true=labels, y_pred=predictedClasses)
+    return metrics.r2_score(labels, blended)
+
+
+def walkForward(estimator, X_history, Y_history, X_season, Y_season, matchdays, interval, classification):
+    # estimator is already fitted on the history; each step refits on the history plus all earlier season matches
+    # a classifier continues from the previous step's weights; mean squared error is only given for regression
+    # data is encoded once and ordered by date, so each step's training set is a slice of the same array
+    import numpy as np
+    from sklearn import metrics
+
+    order = np.argsort(matchdays, kind='stable')
+    X_all = np.concatenate([np.asarray(X_history, dtype=float), np.asarray(X_season, dtype=float)[order]])
+    Y_all = np.concatenate([np.asarray(Y_history), np.asarray(Y_season)[order]])
+    numHistory = len(Y_history)
+
+    blocks = np.asarray(matchdays)[order] // interval
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(blocks)) + 1])
+    ends = np.append(starts[1:], len(blocks))
+
+    model = copy.deepcopy(estimator)
+    if classification:
+        model.set_params(nn__warm_start=True)
+
+    steps = []
+    for i in range(len(starts)):
+        trainEnd = numHistory + starts[i]
+        if i > 0:
+            model.fit(X_all[:trainEnd], Y_all[:trainEnd])
+        X_test = X_all[trainEnd:numHistory + ends[i]]
+        Y_test = Y_all[trainEnd:numHistory + ends[i]]
+        mse = -1 if classification else metrics.mean_squared_error(Y_test, model.predict(X_test))
+        steps.append((i, int(blocks[starts[i]]) * interval, int(trainEnd), len(Y_test), model.score(X_test, Y_test),
+                      mse))
+
+    return steps
+
+
+def recordResults(seasonNumber, error, featureNames, featureCoefficients, fileName, errorLabel='Mean squared error'):
+    # results are grouped in blocks separated by blank lines, one block per season
+    header = 'Predictions for season %d' % seasonNumber
+    blocks = []
+    if os.path.exists(fileName):
+        with open(fileName) as csvfile:
+            blocks = [b for b in csvfile.read().split('\n\n') if b.strip() and not b.startswith(header + '\n')]
+
+    newBlock = [header, '%s: %f' % (errorLabel, error)]
+    for i in range(len(featureNames)):
+        feature = featureNames[i]
+        coefficient = featureCoefficients[0][i]
+        newBlock.append("%s,%s" % (feature, coefficient))
+    blocks.append('\n'.join(newBlock))
+    # blocks stay in season order, so readResults returns errors in season order
+    blocks.sort(key=lambda block: int(block.strip('\n').split('\n')[0].split()[-1]))
+
+    tempName = fileName + '.tmp'
+    with open(tempName, 'w') as csvfile:
+        for block in blocks:
+            csvfile.write(block.strip('\n') + '\n\n')
+    os.replace(tempName, fileName)
+
+
+def recordBacktest(seasonNumber, learningType, steps, fileName):
+    rows = []
+    if os.path.exists(fileName):
+        with open(fileName, newline='') as csvfile:
+            rows = [row for row in csv.reader(csvfile)][1:]
+    rows = [row for row in rows if row[:2] != [str(seasonNumber), learningType]]
+    for step in steps:
+        rows.append([seasonNumber, learningType] + list(step))
+
+    tempName = fileName + '.tmp'
+    with open(tempName, 'w', newline='') as csvfile:
+        backtestWriter = csv.writer(csvfile)
+        backtestWriter.writerow(['Season', 'Model', 'Step', 'FirstMatchday', 'TrainSize', 'TestSize', 'Score', 'MSE'])
+        backtestWriter.writerows(rows)
+    os.replace(tempName, fileName)
+
+
+def recordBootstrap(seasonNumber, featureNames, quantiles, coefficientQuantiles, fileName):
+    rows = []
+    if os.path.exists(fileName):
+        with open(fileName, newline='') as csvfile:
+            rows = [row for row in csv.reader(csvfile)][1:]
+    rows = [row for row in rows if row[0] != str(seasonNumber)]
+    for i in range(len(featureNames)):
+        rows.append([seasonNumber, featureNames[i]] + [coefficientQuantiles[j][i] for j in range(len(quantiles))])
+
+    tempName = fileName + '.tmp'
+    with open(tempName, 'w', newline='') as csvfile:
+        bootstrapWriter = csv.writer(csvfile)
+        bootstrapWriter.writerow(['Season', 'Feature'] + ['Quantile %g' % q for q in quantiles])
+        bootstrapWriter.writerows(rows)
+    os.replace(tempName, fileName)
 
 
 def readResults(fileName, stringsToDelete):
@@ -96,8 +328,9 @@ def readResults(fileName, stringsToDelete):
 
                 if featureName[:4] == 'Pred':
                     curSeason = int(featureName[23:])
-                elif featureName[:4] == 'Mean':
-                    errors.append((curSeason, float(featureName[20:])))
+                elif len(row) == 1:
+                    # error line, e.g. 'Mean squared error: 1.234567'
+                    errors.append((curSeason, float(featureName.split(':')[-1])))
                 else:
                     coefficient = float(row[1])
                     addCoefficient(featureName, coefficient, homeTeams, awayTeams, refs, stats)
@@ -121,6 +354,79 @@ def interpretGoal(goalInput):
         sys.exit("Invalid goal.")
 
 
+def initWorker(estimator, X, Y, groups=None):
+    workerData['estimator'] = estimator
+    workerData['X'] = X
+    workerData['Y'] = Y
+    workerData['groups'] = groups
+
+
+def fitResamples(resamples):
+    # each row of resamples lists the training rows of one bootstrap sample
+    import numpy as np
+    from sklearn import base
+
+    X, Y = workerData['X'], workerData['Y']
+    coefficients = np.empty((len(resamples), X.shape[1]))
+    for i in range(len(resamples)):
+        model = base.clone(workerData['estimator'])
+        model.fit(X[resamples[i]], Y[resamples[i]])
+        coefficients[i] = model.named_steps['svm'].coef_[0]
+    return coefficients
+
+
+def featureGroups(featureNames, oneHotColumns):
+    # columns encoded from the same original column share a group; every other column is a group of its own
+    import numpy as np
+
+    groupNumbers = dict()
+    columnGroups = []
+    isOneHot = []
+    for name in featureNames:
+        original = next((column for column in oneHotColumns if '__' + column + '_' in name), None)
+        groupKey = name if original is None else original
+        if groupKey not in groupNumbers:
+            groupNumbers[groupKey] = len(groupNumbers)
+        columnGroups.append(groupNumbers[groupKey])
+        isOneHot.append(original is not None)
+
+    groups = [[] for _ in range(len(groupNumbers))]
+    for column in range(len(columnGroups)):
+        groups[columnGroups[column]].append(column)
+    return groups, np.array(columnGroups), np.array(isOneHot)
+
+
+def scorePermutations(jobGroups, permutations):
+    # stack one permuted copy of the test set per job and classify them all with one predict_proba call
+    # returns (jobs, rows) array, true where the row is still classified correctly
+    import numpy as np
+
+    X, Y, groups = workerData['X'], workerData['Y'], workerData['groups']
+    estimator = workerData['estimator']
+    numRows = len(Y)
+
+    batch = np.tile(X, (len(jobGroups), 1))
+    for j in range(len(jobGroups)):
+        columns = groups[jobGroups[j]]
+        batch[j * numRows:(j + 1) * numRows, columns] = X[np.ix_(permutations[j], columns)]
+
+    predicted = estimator.classes_[np.argmax(estimator.predict_proba(batch), axis=1)]
+    return (predicted == np.tile(Y, len(jobGroups))).reshape(len(jobGroups), numRows)
+
+
+def stackPredictions(predictions, labels, classification):
+    # one column per model; for classification, each match gives one row per class, with 0/1 target
+    import numpy as np
+
+    if classification:
+        X = np.column_stack([np.asarray(p).ravel() for p in predictions])
+        Y = (np.asarray(labels)[:, None] == np.array(CLASSES)).ravel().astype(float)
+    else:
+        X = np.column_stack([np.asarray(p) for p in predictions])
+        Y = np.asarray(labels, dtype=float)
+    return X, Y
+
+
 def addCoefficient(feature, coefficient, homeDict, awayDict, refDict, statDict):
     if feature.__contains__('HomeTeam'):
         feature = feature.replace('HomeTeam_', '')
@@ -136,6 +442,8 @@ def addCoefficient(feature, coefficient, homeDict, awayDict, refDict, statDict):
 
 
 def printPipelineDetails(estimator, testFeatures, testLabels):
+    from sklearn import metrics
+
     means = estimator.cv_results_['mean_test_score']
     stds = estimator.cv_results_['std_test_score']
     for mean, std, params in zip(means, stds, estimator.cv_results_['params']):
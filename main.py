@@ -1,10 +1,9 @@
-import pandas as pd
+# heavy modules (pandas, sklearn, matplotlib) are imported inside the functions that need them,
+# so that short commands such as plot or clean-referees do not pay for the others at startup
+import argparse
 
-import art
 import interpretFeatures
 import learningUtil
-import processData
-import readPLData
 
 
 # data files are labelled by season number, e.g. 01 for 1993-94 and 12 for 2004-05
@@ -15,6 +14,10 @@ LAST_SEASON = 28
 FEATURE_DICTIONARY_NAME = 'featureDictionary.csv'
 REF_FILE_NAME = 'referees.csv'
 RESULTS_FILE_NAME = 'results.csv'
+QUARANTINE_FILE_NAME = 'quarantine.csv'
+BOOTSTRAP_FILE_NAME = 'bootstrap.csv'
+IMPORTANCE_FILE_NAME = 'importances.csv'
+BACKTEST_FILE_NAME = 'backtest.csv'
 
 NUMERIC_TYPES = ['int16', 'int32', 'int64', 'float16', 'float32', 'float64']
 NON_NUMERICS = ['HomeTeam', 'AwayTeam', 'HTR', 'Referee']           # removed 'FTR'
@@ -39,17 +42,55 @@ USABLE_FEATURES = ['Date',
                    'HR',
                    'AR']
 OUTPUT_COLUMNS = ['FTHG', 'FTAG']                                   # removed 'FTR'
+RESULT_CODES = ['H', 'D', 'A']
+FEATURE_SCHEMA = {'Date': ('date', None),                           # (kind, limit) as in processData.validateSeason
+                  'HomeTeam': ('text', None),
+                  'AwayTeam': ('text', None),
+                  'HTHG': ('count', 10),
+                  'HTAG': ('count', 10),
+                  'HTR': ('text', RESULT_CODES),
+                  'Referee': ('text', None),
+                  'HS': ('count', 60),
+                  'AS': ('count', 60),
+                  'HST': ('count', 40),
+                  'AST': ('count', 40),
+                  'HC': ('count', 30),
+                  'AC': ('count', 30),
+                  'HF': ('count', 50),
+                  'AF': ('count', 50),
+                  'HY': ('count', 11),
+                  'AY': ('count', 11),
+                  'HR': ('count', 5),
+                  'AR': ('count', 5),
+                  'FTHG': ('count', 15),
+                  'FTAG': ('count', 15)}
 NUM_STR = 'toNumeric'
 REM_STR = 'remainder'
+ODDS_FEATURES = False                                               # add bookmakerOdds features to match features
+AGGREGATE_ODDS_PREFIXES = ['Max', 'Avg', 'BbMx', 'BbAv']            # market columns, not individual bookmakers
 
 CROSS_VALIDATION = 5
 MAX_LAYERS = 4
 LAYER_SIZES = [20, 50, 100]
 HISTORY_LENGTH = 5
+NUM_SIMULATIONS = 100000
+RETRAIN_INTERVAL = 3                # matchdays between refits in a walk-forward backtest
+BOOTSTRAP_QUANTILES = [0.025, 0.5, 0.975]
+IMPORTANCE_REPEATS = 10
+ENSEMBLE_MAX_LENGTH = 8             # history lengths 1 to this are blended by sweep --ensemble
 
 
 def runPreliminaryFunctions(features, refDict):
     # To be run before anything else and ignored once data has been sufficiently cleaned
+    scanData(features)
+    return cleanReferees(refDict)
+
+
+def scanData(features):
+    import art
+    import processData
+    import readPLData
+
     # Step 1: find features which are present in all recent seasons (results in selectFeatures)
     art.createFeatureTimeline(features, FIRST_SEASON, LAST_SEASON)
     print("At this point, you should check that the FIRST_USEFUL_SEASON and USABLE_FEATURES "
@@ -77,6 +118,11 @@ def runPreliminaryFunctions(features, refDict):
             print("These columns should be added to NON_NUMERICS or addressed manually.")
     processData.checkContinue()
 
+
+def cleanReferees(refDict):
+    import processData
+    import readPLData
+
     # Step 4: clean up referee list (results in referees.csv)
     refList = readPLData.getRefereeList(FIRST_USEFUL_SEASON, LAST_SEASON)
     refDict = readPLData.mergeDuplicateReferees(refList, refDict, REF_FILE_NAME)
@@ -88,43 +134,109 @@ def runPreliminaryFunctions(features, refDict):
 
 def processAllData(seasonsToTrain, seasonsToTest, refDict, dictEmpty):
     # read files for a list of season numbers, merge, convert to usable format
+    import pandas as pd
+    import processData
+
     trainingList = [None] * len(seasonsToTrain)
     for i in range(len(seasonsToTrain)):
-        trainingList[i] = processData.processSeason(seasonsToTrain[i], refDict, dictEmpty, REF_FILE_NAME,
-                                                    USABLE_FEATURES + OUTPUT_COLUMNS)
-    train = pd.concat(trainingList, ignore_index=True, copy=False)
+        trainingList[i] = processData.loadSeason(seasonsToTrain[i], refDict, dictEmpty, REF_FILE_NAME,
+                                                 USABLE_FEATURES + OUTPUT_COLUMNS, FEATURE_SCHEMA, NON_NUMERICS)[0]
+    train = pd.concat([entry['frame'] for entry in trainingList], ignore_index=True, copy=False)
 
     testingList = [None] * len(seasonsToTest)
     for i in range(len(seasonsToTest)):
-        testingList[i] = processData.processSeason(seasonsToTest[i], refDict, dictEmpty, REF_FILE_NAME,
-                                                   USABLE_FEATURES + OUTPUT_COLUMNS)
-    test = pd.concat(testingList, ignore_index=True, copy=False)
+        testingList[i] = processData.loadSeason(seasonsToTest[i], refDict, dictEmpty, REF_FILE_NAME,
+                                                USABLE_FEATURES + OUTPUT_COLUMNS, FEATURE_SCHEMA, NON_NUMERICS)[0]
+    test = pd.concat([entry['frame'] for entry in testingList], ignore_index=True, copy=False)
 
     processData.checkDataMerge(train, test)
 
-    return processData.convertToNumeric(train, test, NON_NUMERICS, NUM_STR)
+    # seasons are encoded once, when first read; a window only lines up their vocabularies
+    allData = processData.encodeSeasons([entry['encoding'] for entry in trainingList + testingList], NON_NUMERICS,
+                                        NUM_STR)
+    if ODDS_FEATURES:
+        addOddsFeatures(allData, list(seasonsToTrain) + list(seasonsToTest), trainingList + testingList,
+                        train.shape[0])
+    return allData.iloc[:train.shape[0]], allData.iloc[train.shape[0]:]
 
 
-def learnSeasons(learningType, seasonsToTrain, seasonsToTest, refDict, dictEmpty):
-    classification = (learningType == 'nn')
+def addOddsFeatures(allData, seasons, entries, trainSize):
+    # odds features of the rows kept in each season, as passthrough columns; matches no bookmaker priced
+    # get the training mean, and a window whose training seasons have no odds at all is left without them
+    import pandas as pd
+    import bookmakerOdds
+
+    bookmakerColumns = interpretFeatures.getBookmakerColumns(FEATURE_DICTIONARY_NAME, AGGREGATE_ODDS_PREFIXES)
+    oddsDF = pd.concat([bookmakerOdds.seasonOddsFeatures(season, bookmakerColumns).reindex(entry['frame'].index)
+                        for season, entry in zip(seasons, entries)], ignore_index=True)
+    trainMeans = oddsDF.iloc[:trainSize].mean()
+    if trainMeans.isna().any():
+        print("No bookmaker odds in training seasons; odds features are left out of this window.")
+        return
+    oddsDF = oddsDF.fillna(trainMeans)
+    for name in bookmakerOdds.ODDS_FEATURE_NAMES:
+        allData[REM_STR + '__' + name] = oddsDF[name].to_numpy(dtype=float)
+
+
+def prepareSeasons(classification, seasonsToTrain, seasonsToTest, refDict, dictEmpty):
+    import processData
 
     train, test = processAllData(seasonsToTrain, seasonsToTest, refDict, dictEmpty)
     newFeatNames, newLabelNames = processData.featureLabelSplitNames(list(train.columns), OUTPUT_COLUMNS, REM_STR)
     trainFeatures, trainLabels = processData.featureLabelSplitData(train, newFeatNames, newLabelNames, classification)
     testFeatures, testLabels = processData.featureLabelSplitData(test, newFeatNames, newLabelNames, classification)
+    return trainFeatures, trainLabels, testFeatures, testLabels, newFeatNames
+
+
+def learnSeasons(learningType, seasonsToTrain, seasonsToTest, refDict, dictEmpty, numResamples=0, numRepeats=0):
+    # numResamples > 0 adds bootstrap quantiles of the svm coefficients to the results,
+    # numRepeats > 0 adds permutation importances of the nn features
+    classification = (learningType == 'nn')
+
+    trainFeatures, trainLabels, testFeatures, testLabels, newFeatNames = prepareSeasons(classification, seasonsToTrain,
+                                                                                        seasonsToTest, refDict,
+                                                                                        dictEmpty)
 
     if learningType == 'nn':
         activationFns, layerList, alphaValues = initHyperparameters(learningType)
-        return learningUtil.neuralNetworkPipeline(trainFeatures, trainLabels, testFeatures, testLabels, layerList,
-                                                  activationFns, alphaValues, CROSS_VALIDATION, False)
+        results = learningUtil.neuralNetworkPipeline(trainFeatures, trainLabels, testFeatures, testLabels, layerList,
+                                                     activationFns, alphaValues, CROSS_VALIDATION, False, numRepeats,
+                                                     newFeatNames, NON_NUMERICS)
+        return results + tuple([newFeatNames])
 
     if learningType == 'svm':
         kernelFns, degrees, kernelTerms, regularizationTerms, tubeTerms = initHyperparameters(learningType)
         results = learningUtil.svmPipeline(trainFeatures, trainLabels, testFeatures, testLabels, kernelFns, degrees,
-                                           kernelTerms, regularizationTerms, tubeTerms, CROSS_VALIDATION, False)
+                                           kernelTerms, regularizationTerms, tubeTerms, CROSS_VALIDATION, False,
+                                           numResamples, BOOTSTRAP_QUANTILES)
         return results + tuple([newFeatNames])
 
 
+def cachedLearnSeasons(learningType, seasonsToTrain, seasonsToTest, refDict, dictEmpty, numResamples=0,
+                       numRepeats=0):
+    # same as learnSeasons, but windows already computed with identical data and settings are read from disk
+    import experimentCache
+    import processData
+
+    if dictEmpty:
+        processData.readRefFile(refDict, REF_FILE_NAME)
+    encoderSettings = [USABLE_FEATURES + OUTPUT_COLUMNS, NON_NUMERICS, NUM_STR, FEATURE_SCHEMA, RESULT_CODES]
+    if ODDS_FEATURES:
+        # only when enabled, so windows computed without odds keep their keys
+        encoderSettings.append(AGGREGATE_ODDS_PREFIXES)
+    hyperparameters = [initHyperparameters(learningType), CROSS_VALIDATION, numResamples, BOOTSTRAP_QUANTILES,
+                       numRepeats]
+    key = experimentCache.windowKey(seasonsToTrain, seasonsToTest, refDict, encoderSettings, learningType,
+                                    hyperparameters)
+
+    results = experimentCache.loadWindow(key)
+    if results is None:
+        results = learnSeasons(learningType, seasonsToTrain, seasonsToTest, refDict, False, numResamples,
+                               numRepeats)
+        experimentCache.storeWindow(key, results)
+    return tuple(results)
+
+
 def initHyperparameters(MLType):
     if MLType == 'nn':
         # fns = ['identity', 'logistic', 'tanh', 'relu']
@@ -146,45 +258,239 @@ def initHyperparameters(MLType):
         return fns, degs, kers, regs, tubes
 
 
-def findBestHistoryLength(goal, refDict, dictEmpty):
+def findBestHistoryLength(goal, refDict, dictEmpty, ensemble=False):
     # for each k, predict each season using preceding k seasons, plot to find best k
+    # with ensemble, also plot the score of blending the predictions for k = 1, ..., ENSEMBLE_MAX_LENGTH
+    import art
+
     mlType, measuredValue = learningUtil.interpretGoal(goal)
     stacksToPlot = dict()
+    predictions = dict()        # (k, season to predict) -> test predictions
 
     for k in range(1, LAST_SEASON - FIRST_USEFUL_SEASON + 1):
         numCases = LAST_SEASON - k + 1 - FIRST_USEFUL_SEASON
         y = [0.0] * numCases
         for j in range(numCases):
-            score, e, m, f = learnSeasons(mlType, range(FIRST_USEFUL_SEASON + j, FIRST_USEFUL_SEASON + j + k),
-                                          [FIRST_USEFUL_SEASON + j + k], refDict, dictEmpty)
-            y[j] = score
+            results = cachedLearnSeasons(mlType, range(FIRST_USEFUL_SEASON + j, FIRST_USEFUL_SEASON + j + k),
+                                         [FIRST_USEFUL_SEASON + j + k], refDict, dictEmpty)
+            y[j] = results[0]
+            predictions[k, FIRST_USEFUL_SEASON + j + k] = results[4]
         stacksToPlot[k] = y
 
-    art.createHistoryPlot(goal, measuredValue, LAST_SEASON - FIRST_USEFUL_SEASON + 1, stacksToPlot)
+    ensembleScores = None
+    if ensemble:
+        ensembleScores = blendHistoryLengths(mlType, predictions, refDict)
+    art.createHistoryPlot(goal, measuredValue, LAST_SEASON - FIRST_USEFUL_SEASON + 1, stacksToPlot, ensembleScores)
+
 
+def blendHistoryLengths(learningType, predictions, refDict):
+    # blend the sweep's predictions for each season, with weights fitted on the predictions for earlier seasons,
+    # so every season is scored out of sample; the first season predicted by every k only trains the blender
+    import numpy as np
+    import processData
 
-def computeResults(dictEmpty):
+    classification = (learningType == 'nn')
+    lengths = range(1, ENSEMBLE_MAX_LENGTH + 1)
+    firstSeason = FIRST_USEFUL_SEASON + ENSEMBLE_MAX_LENGTH
+    labels = dict()
+    for season in range(firstSeason, LAST_SEASON + 1):
+        seasonDF = processData.loadSeason(season, refDict, False, REF_FILE_NAME, USABLE_FEATURES + OUTPUT_COLUMNS,
+                                          FEATURE_SCHEMA, NON_NUMERICS)[0]['frame']
+        labels[season] = (seasonDF[OUTPUT_COLUMNS[0]] - seasonDF[OUTPUT_COLUMNS[1]]).to_numpy()
+        if classification:
+            labels[season] = np.sign(labels[season])
+
+    scores = []
+    for season in range(firstSeason + 1, LAST_SEASON + 1):
+        history = range(firstSeason, season)
+        blender = learningUtil.fitBlender([[predictions[k, s] for k in lengths] for s in history],
+                                          [labels[s] for s in history], classification)
+        scores.append(learningUtil.blendedScore(blender, [predictions[k, season] for k in lengths], labels[season],
+                                                classification))
+        print("Season %d: ensemble score %.3f, weights %s." % (season, scores[-1],
+                                                                 np.array2string(blender.coef_, precision=2)))
+    return scores
+
+
+def computeResults(refDict, dictEmpty, numResamples=0):
     numCases = LAST_SEASON - HISTORY_LENGTH + 1 - FIRST_USEFUL_SEASON
     for j in range(numCases):
         print("Started case %d of %d." % (j + 1, numCases))
         seasonToPredict = FIRST_USEFUL_SEASON + j + HISTORY_LENGTH
-        s, e, m, f = learnSeasons('svm', range(FIRST_USEFUL_SEASON + j, FIRST_USEFUL_SEASON + j + HISTORY_LENGTH),
-                                  [seasonToPredict], refereeDict, dictEmpty)
+        seasonsToTrain = range(FIRST_USEFUL_SEASON + j, FIRST_USEFUL_SEASON + j + HISTORY_LENGTH)
+        s, e, m, q, p, f = cachedLearnSeasons('svm', seasonsToTrain, [seasonToPredict], refDict, dictEmpty,
+                                              numResamples)
         learningUtil.recordResults(seasonToPredict, e, f, m, RESULTS_FILE_NAME)
+        if q is not None:
+            learningUtil.recordBootstrap(seasonToPredict, f, BOOTSTRAP_QUANTILES, q, BOOTSTRAP_FILE_NAME)
 
 
-if __name__ == '__main__':
-    featureDict = interpretFeatures.buildInterpreter(FEATURE_DICTIONARY_NAME)
-    matchFeatures = interpretFeatures.getMatchFeatures(FEATURE_DICTIONARY_NAME, NUM_MATCH_FEATURES)
-    refereeDict = dict()
+def computeImportances(refDict, dictEmpty, numRepeats):
+    # recorded like computeResults, so that the importances can be plotted in the same way as svm coefficients;
+    # the error recorded is the misclassification rate
+    numCases = LAST_SEASON - HISTORY_LENGTH + 1 - FIRST_USEFUL_SEASON
+    for j in range(numCases):
+        print("Started case %d of %d." % (j + 1, numCases))
+        seasonToPredict = FIRST_USEFUL_SEASON + j + HISTORY_LENGTH
+        seasonsToTrain = range(FIRST_USEFUL_SEASON + j, FIRST_USEFUL_SEASON + j + HISTORY_LENGTH)
+        a, e, p, i, r, f = cachedLearnSeasons('nn', seasonsToTrain, [seasonToPredict], refDict, dictEmpty,
+                                           numRepeats=numRepeats)
+        learningUtil.recordResults(seasonToPredict, 1 - a, f, i, IMPORTANCE_FILE_NAME, 'Misclassification rate')
+
+
+def simulateSeason(seasonToPredict, refDict, dictEmpty, numSimulations):
+    # predict every fixture of a season from the preceding seasons, then simulate the final table
+    # the spread of simulated results is estimated on the training seasons only, never on the season predicted
+    import processData
+    import seasonSimulator
+
+    seasonsToTrain = range(seasonToPredict - HISTORY_LENGTH, seasonToPredict)
+    trainFeatures, trainLabels, testFeatures, testLabels, f = prepareSeasons(False, seasonsToTrain, [seasonToPredict],
+                                                                             refDict, dictEmpty)
+    kernelFns, degrees, kernelTerms, regularizationTerms, tubeTerms = initHyperparameters('svm')
+    search = learningUtil.svmSearch(trainFeatures, trainLabels, kernelFns, degrees, kernelTerms, regularizationTerms,
+                                    tubeTerms, CROSS_VALIDATION)
+    predictedDiffs = search.predict(testFeatures)
+    residualStd = learningUtil.residualSpread(search.best_estimator_, trainFeatures, trainLabels, CROSS_VALIDATION)
+
+    fixtureDF = processData.processSeason(seasonToPredict, refDict, False, REF_FILE_NAME,
+                                          USABLE_FEATURES + OUTPUT_COLUMNS, FEATURE_SCHEMA, NON_NUMERICS)
+    teams, homeIdx, awayIdx = seasonSimulator.fixturesFromFrame(fixtureDF)
+    positionCounts, meanPoints = seasonSimulator.simulateSeasons(homeIdx, awayIdx, len(teams), predictedDiffs,
+                                                                 residualStd, numSimulations)
+    summary = seasonSimulator.summarizeSimulation(teams, positionCounts, meanPoints)
+    seasonSimulator.printSimulation(summary)
+    return summary
+
+
+def backtestSeason(learningType, seasonToPredict, refDict, dictEmpty, retrainInterval):
+    # walk forward through a season, refitting every retrainInterval matchdays and scoring the matches that follow
+    import processData
+
+    classification = (learningType == 'nn')
+    seasonsToTrain = range(seasonToPredict - HISTORY_LENGTH, seasonToPredict)
+    trainFeatures, trainLabels, testFeatures, testLabels, f = prepareSeasons(classification, seasonsToTrain,
+                                                                             [seasonToPredict], refDict, dictEmpty)
+    entry = processData.loadSeason(seasonToPredict, refDict, False, REF_FILE_NAME, USABLE_FEATURES + OUTPUT_COLUMNS,
+                                   FEATURE_SCHEMA, NON_NUMERICS)[0]
+    matchdays = processData.getMatchdays(entry['dates'])
+
+    if classification:
+        activationFns, layerList, alphaValues = initHyperparameters(learningType)
+        search = learningUtil.neuralNetworkSearch(trainFeatures, trainLabels, layerList, activationFns, alphaValues,
+                                                  CROSS_VALIDATION)
+    else:
+        kernelFns, degrees, kernelTerms, regularizationTerms, tubeTerms = initHyperparameters(learningType)
+        search = learningUtil.svmSearch(trainFeatures, trainLabels, kernelFns, degrees, kernelTerms,
+                                        regularizationTerms, tubeTerms, CROSS_VALIDATION)
+
+    steps = learningUtil.walkForward(search.best_estimator_, trainFeatures, trainLabels, testFeatures, testLabels,
+                                     matchdays, retrainInterval, classification)
+    learningUtil.recordBacktest(seasonToPredict, learningType, steps, BACKTEST_FILE_NAME)
+    return steps
 
-    runPreliminaryFunctions(matchFeatures, refereeDict)
 
-    # findBestHistoryLength('Classification', refereeDict, True)
-    findBestHistoryLength('Regression', refereeDict, True)
+def updateSeason(seasonNumber, refDict, dictEmpty):
+    # process lines added to a season file since the last run, and list every window which reads that season,
+    # as (history length, season to predict); cached outcomes are keyed by file contents, so the next compute,
+    # importance or sweep run refits only these
+    import processData
 
-    computeResults(True)
+    entry, numNewRows = processData.loadSeason(seasonNumber, refDict, dictEmpty, REF_FILE_NAME,
+                                               USABLE_FEATURES + OUTPUT_COLUMNS, FEATURE_SCHEMA, NON_NUMERICS)
+    print("Season %d: %d new rows, %d rows in total." % (seasonNumber, numNewRows, entry['frame'].shape[0]))
+    if numNewRows == 0:
+        return []
 
-    eResults, HTResults, ATResults, refResults, statsResults = learningUtil.readResults('results.csv',
+    windows = []
+    for k in range(1, LAST_SEASON - FIRST_USEFUL_SEASON + 1):
+        # windows of findBestHistoryLength; those with k = HISTORY_LENGTH are also the compute and importance windows
+        predicted = list(range(max(seasonNumber, FIRST_USEFUL_SEASON + k), min(seasonNumber + k, LAST_SEASON) + 1))
+        if not predicted:
+            continue
+        windows += [(k, seasonToPredict) for seasonToPredict in predicted]
+        usedBy = 'sweep, compute and importance' if k == HISTORY_LENGTH else 'sweep'
+        seasons = 'season %d' % predicted[0] if len(predicted) == 1 else 'seasons %d-%d' % (predicted[0], predicted[-1])
+        print("Affected (%s): history length %d, predicting %s." % (usedBy, k, seasons))
+    return windows
+
+
+def plotResults(fileName, imageName=None, dataName=None):
+    # without an image file name, the plot is shown on screen
+    import art
+
+    eResults, HTResults, ATResults, refResults, statsResults = learningUtil.readResults(fileName,
                                                                                         [NUM_STR, REM_STR, '__'])
-    art.plotResults(eResults, HTResults, ATResults, refResults, statsResults)
+    if imageName is None:
+        art.plotResults(eResults, HTResults, ATResults, refResults, statsResults)
+    else:
+        art.renderResults(eResults, HTResults, ATResults, refResults, statsResults, imageName)
+    if dataName is not None:
+        art.exportResults(eResults, HTResults, ATResults, refResults, statsResults, dataName)
+
+
+def parseArguments(argv=None):
+    parser = argparse.ArgumentParser(description='Learn from Premier League data.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('scan', help='check feature availability, team names and non-numeric columns')
+    commands.add_parser('clean-referees', help='merge aliases of referee names into %s' % REF_FILE_NAME)
+    sweep = commands.add_parser('sweep', help='score each history length, to choose HISTORY_LENGTH')
+    sweep.add_argument('--goal', choices=['Regression', 'Classification'], default='Regression')
+    sweep.add_argument('--ensemble', action='store_true',
+                       help='also blend history lengths 1 to %d, scoring each season out of sample'
+                       % ENSEMBLE_MAX_LENGTH)
+    compute = commands.add_parser('compute',
+                                  help='record svm error and coefficients for each season in %s' % RESULTS_FILE_NAME)
+    compute.add_argument('--bootstrap', type=int, default=0, metavar='RESAMPLES',
+                         help='also record coefficient quantiles from this many resamples in %s' % BOOTSTRAP_FILE_NAME)
+    importance = commands.add_parser('importance', help='record nn permutation importances for each season in %s'
+                                     % IMPORTANCE_FILE_NAME)
+    importance.add_argument('--repeats', type=int, default=IMPORTANCE_REPEATS)
+    plot = commands.add_parser('plot', help='plot recorded results (or importances, with --results %s)'
+                               % IMPORTANCE_FILE_NAME)
+    plot.add_argument('--results', default=RESULTS_FILE_NAME)
+    plot.add_argument('--output', help='save plot to this file (png, svg, ...) instead of showing it')
+    plot.add_argument('--json', help='also save plotted data to this json file')
+    predict = commands.add_parser('predict', help='simulate the final table of a season')
+    predict.add_argument('--season', type=int, default=LAST_SEASON)
+    predict.add_argument('--simulations', type=int, default=NUM_SIMULATIONS)
+    backtest = commands.add_parser('backtest', help='walk forward through a season, refitting as matches are played')
+    backtest.add_argument('--model', choices=['svm', 'nn'], default='svm')
+    backtest.add_argument('--season', type=int, default=LAST_SEASON)
+    backtest.add_argument('--interval', type=int, default=RETRAIN_INTERVAL)
+    update = commands.add_parser('update', help='process new lines of a season file and list the windows to refit')
+    update.add_argument('--season', type=int, default=LAST_SEASON)
+
+    return parser.parse_args(argv)
+
+
+def runCommand(args):
+    refereeDict = dict()
+
+    if args.command == 'scan':
+        scanData(interpretFeatures.getMatchFeatures(FEATURE_DICTIONARY_NAME, NUM_MATCH_FEATURES))
+    elif args.command == 'clean-referees':
+        cleanReferees(refereeDict)
+    elif args.command == 'sweep':
+        findBestHistoryLength(args.goal, refereeDict, True, args.ensemble)
+    elif args.command == 'compute':
+        computeResults(refereeDict, True, args.bootstrap)
+    elif args.command == 'importance':
+        computeImportances(refereeDict, True, args.repeats)
+    elif args.command == 'plot':
+        plotResults(args.results, args.output, args.json)
+    elif args.command == 'predict':
+        simulateSeason(args.season, refereeDict, True, args.simulations)
+    elif args.command == 'backtest':
+        backtestSeason(args.model, args.season, refereeDict, True, args.interval)
+    elif args.command == 'update':
+        updateSeason(args.season, refereeDict, True)
+
+    if args.command in ['sweep', 'compute', 'importance', 'predict', 'backtest', 'update']:
+        import processData
+        processData.writeQuarantine(QUARANTINE_FILE_NAME)
+
+
+if __name__ == '__main__':
+    runCommand(parseArguments())
@@ -1,8 +1,13 @@
 """
 This file contains functions for converting raw csv files to usable dataframes.
 
-processSeason: read in data for a particular season
+processSeason: read in data for a particular season, validate it against a schema and cache the result
+loadSeason: get cached season (dataframe and columnar encoding), processing only lines appended since last run
+validateSeason: check columns against schema, separate rows which fail any check along with the reasons
+writeQuarantine: save all quarantined rows, with reasons, to csv
+getMatchdays: number each match of a season by its date, given the dates kept by loadSeason
 convertToNumeric: convert all non-numeric columns in dataframe using ColumnTransformer
+encodeSeasons: same output as convertToNumeric, built from columnar season encodings
 featureLabelSplitNames: get new feature and label names after running columnTransformer
 featureLabelSplitData: split data into features and labels
 checkContinue: check with user to continue or exit
@@ -10,33 +15,124 @@ checkDataMerge: verify that datasets merged as expected
 
 The following are just helper functions:
     readRefFile
+    appendRows
+    appendEncoding
+    addReason
     translateRefereeColumn
     parseDateInfo
 """
 
 import csv
 import datetime
+import io
+import json
 import numpy as np
 import pandas as pd
 import sys
 
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder
-
 import readPLData
+import seasonCache
 
+REMAINDER_STR = 'remainder'     # prefix ColumnTransformer gives to passthrough columns
+
+processedSeasons = dict()       # season settings -> entry, as stored by seasonCache
+quarantinedRows = dict()        # season -> dataframe of rows which failed validation
+
+
+def processSeason(seasonNumber, refDict, dictEmpty, fileName, features, schema=None, nonNumerics=None):
+    # rows keep their position in the file as index, so they can be matched with other columns of the file
+    entry, numNewRows = loadSeason(seasonNumber, refDict, dictEmpty, fileName, features, schema, nonNumerics)
+    return entry['frame'].copy()
+
+
+def loadSeason(seasonNumber, refDict, dictEmpty, fileName, features, schema=None, nonNumerics=None):
+    # returns entry and number of rows processed by this call
+    # an entry is kept in memory for the rest of the run and on disk for later runs; if the season file has only
+    # grown since, the new lines are parsed, validated and encoded (with the stored vocabulary) and appended
+    if dictEmpty:
+        readRefFile(refDict, fileName)
+    settings = json.dumps([seasonCache.CACHE_VERSION, seasonNumber, list(features), schema, sorted(refDict.items()),
+                           nonNumerics])
+
+    entry = processedSeasons.get(settings)
+    if entry is None:
+        entry = seasonCache.loadEntry(seasonNumber)
+    status, newData, byteSize, fileHash = seasonCache.checkFile(readPLData.fileFromNumber(seasonNumber), entry,
+                                                                settings)
+    if status == 'changed':
+        entry = {'settings': settings, 'rowCount': 0, 'frame': None, 'dates': None, 'encoding': None,
+                 'quarantined': None}
+
+    numNewRows = 0
+    if status != 'unchanged':
+        numNewRows = appendRows(entry, newData, seasonNumber, refDict, features, schema, nonNumerics)
+        entry['byteSize'] = byteSize
+        entry['fileHash'] = fileHash
+        seasonCache.storeEntry(seasonNumber, entry)
+
+    processedSeasons[settings] = entry
+    if entry['quarantined'] is None:
+        quarantinedRows.pop(seasonNumber, None)
+    else:
+        quarantinedRows[seasonNumber] = entry['quarantined']
+    return entry, numNewRows
+
+
+def validateSeason(seasonDF, seasonNumber, schema):
+    # schema maps column to (kind, limit): ('count', maximum), ('text', allowed values or None) or ('date', None)
+    # each check runs on a whole column; returns valid rows, and rows failing any check with all their reasons
+    # empty rows, which some files have at the end, are dropped without comment
+    seasonDF = seasonDF.dropna(how='all').copy()
+    originalDF = seasonDF.copy()
+    reasons = pd.Series('', index=seasonDF.index)
+    for column, (kind, limit) in schema.items():
+        if column not in seasonDF:
+            continue
+        missing = seasonDF[column].isna()
+        reasons = addReason(reasons, missing, column + ' missing')
+        if kind == 'count':
+            numbers = pd.to_numeric(seasonDF[column], errors='coerce')
+            reasons = addReason(reasons, numbers.isna() & ~missing, column + ' not a number')
+            outOfRange = numbers.notna() & ((numbers < 0) | (numbers > limit) | (numbers % 1 != 0))
+            reasons = addReason(reasons, outOfRange, column + ' not a count up to %d' % limit)
+            seasonDF[column] = numbers
+        elif kind == 'date':
+            dates = pd.to_datetime(seasonDF[column], dayfirst=True, errors='coerce')
+            reasons = addReason(reasons, dates.isna() & ~missing, column + ' not a date')
+            seasonDF[column] = dates
+        elif kind == 'text' and limit is not None:
+            reasons = addReason(reasons, ~seasonDF[column].isin(limit) & ~missing,
+                                column + ' not one of ' + '/'.join(limit))
+
+    invalid = reasons != ''
+    quarantined = None
+    if invalid.any():
+        quarantined = originalDF[invalid].copy()
+        quarantined.insert(0, 'Season', seasonNumber)
+        quarantined.insert(1, 'Reason', reasons[invalid].str.rstrip('; '))
+        print("Quarantined %d of %d rows in season %d." % (invalid.sum(), seasonDF.shape[0], seasonNumber))
+
+    return seasonDF[~invalid], quarantined
+
+
+def writeQuarantine(fileName):
+    if quarantinedRows:
+        allQuarantined = pd.concat(quarantinedRows.values())
+    else:
+        allQuarantined = pd.DataFrame(columns=['Season', 'Reason'])
+    allQuarantined.to_csv(fileName, index_label='Row')
 
-def processSeason(seasonNumber, refDict, dictEmpty, fileName, features):
-    seasonDF = pd.read_csv(readPLData.fileFromNumber(seasonNumber),
-                           usecols=features,
-                           parse_dates=['Date'],
-                           infer_datetime_format=True, dayfirst=True)
-    seasonDF = translateRefereeColumn(seasonDF, refDict, dictEmpty, fileName)
-    seasonDF = parseDateInfo(seasonDF, seasonNumber)
-    return seasonDF
+
+def getMatchdays(dates):
+    # matchday i is the i-th distinct date on which matches were played, counting from 0
+    # dates are the validated dates of an entry, so rows quarantined for a bad date cannot scramble the order
+    return dates.rank(method='dense').to_numpy(dtype=int) - 1
 
 
 def convertToNumeric(train, test, nonNumerics, toNumStr):
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import OneHotEncoder
+
     ct = ColumnTransformer([(toNumStr, OneHotEncoder(), nonNumerics)],
                            remainder='passthrough')
 
@@ -45,7 +141,34 @@ def convertToNumeric(train, test, nonNumerics, toNumStr):
     allData = pd.concat([train, test], ignore_index=True, copy=False)
     allData = pd.DataFrame(ct.fit_transform(allData).toarray(), columns=ct.get_feature_names_out())
 
-    return allData.loc[0:trainSize], allData.loc[trainSize:trainSize+testSize]
+    return allData.iloc[:trainSize], allData.iloc[trainSize:trainSize+testSize]
+
+
+def encodeSeasons(encodings, nonNumerics, toNumStr):
+    # one-hot columns use the sorted union of the seasons' vocabularies, as OneHotEncoder would;
+    # remaining columns follow the order of the first season, as ColumnTransformer's passthrough would
+    numRows = [len(e['codes']) for e in encodings]
+    rowStarts = np.cumsum([0] + numRows)
+    columnNames = []
+    blocks = []
+
+    for k in range(len(nonNumerics)):
+        categories = sorted(set().union(*[e['vocabulary'][nonNumerics[k]] for e in encodings]))
+        positions = {category: i for i, category in enumerate(categories)}
+        oneHot = np.zeros((rowStarts[-1], len(categories)))
+        for i in range(len(encodings)):
+            seasonPositions = np.array([positions[c] for c in encodings[i]['vocabulary'][nonNumerics[k]]], dtype=int)
+            codes = encodings[i]['codes'][:, k]
+            oneHot[np.arange(rowStarts[i], rowStarts[i + 1]), seasonPositions[codes]] = 1
+        columnNames += ['%s__%s_%s' % (toNumStr, nonNumerics[k], c) for c in categories]
+        blocks.append(oneHot)
+
+    numericNames = encodings[0]['numericNames']
+    blocks.append(np.concatenate([e['numeric'][:, [e['numericNames'].index(n) for n in numericNames]]
+                                  for e in encodings]).astype(float))
+    columnNames += ['%s__%s' % (REMAINDER_STR, n) for n in numericNames]
+
+    return pd.DataFrame(np.hstack(blocks), columns=columnNames)
 
 
 def featureLabelSplitNames(allCols, oldLabels, prefix):
@@ -100,6 +223,56 @@ def readRefFile(refDict, filename):
             refDict[alias] = trueName
 
 
+def addReason(reasons, mask, reason):
+    return reasons.mask(mask, reasons + reason + '; ')
+
+
+def appendRows(entry, csvData, seasonNumber, refDict, features, schema, nonNumerics):
+    # csvData is the header line followed by the lines not yet in the entry
+    seasonDF = pd.read_csv(io.BytesIO(csvData),
+                           usecols=features,
+                           parse_dates=['Date'],
+                           infer_datetime_format=True, dayfirst=True)
+    seasonDF.index = seasonDF.index + entry['rowCount']
+    entry['rowCount'] += seasonDF.shape[0]
+
+    if schema is not None:
+        seasonDF, quarantined = validateSeason(seasonDF, seasonNumber, schema)
+        if quarantined is not None:
+            entry['quarantined'] = pd.concat([entry['quarantined'], quarantined])
+    seasonDF = translateRefereeColumn(seasonDF, refDict, False, None)
+    # parseDateInfo keeps only the month of each date, so the dates themselves are kept beside the frame
+    entry['dates'] = pd.concat([entry['dates'], seasonDF['Date'].copy()])
+    seasonDF = parseDateInfo(seasonDF, seasonNumber)
+
+    entry['frame'] = pd.concat([entry['frame'], seasonDF])
+    if nonNumerics is not None:
+        entry['encoding'] = appendEncoding(entry['encoding'], seasonDF, nonNumerics)
+    return seasonDF.shape[0]
+
+
+def appendEncoding(encoding, seasonDF, nonNumerics):
+    # non-numeric columns are stored as codes into a vocabulary; codes of existing rows never change,
+    # since categories seen for the first time are added at the end of the vocabulary
+    if encoding is None:
+        numericNames = [column for column in seasonDF.columns if column not in nonNumerics]
+        encoding = {'vocabulary': {column: [] for column in nonNumerics},
+                    'codes': np.empty((0, len(nonNumerics)), dtype=np.int32),
+                    'numericNames': numericNames,
+                    'numeric': np.empty((0, len(numericNames)), dtype=np.float32)}
+
+    codes = np.empty((seasonDF.shape[0], len(nonNumerics)), dtype=np.int32)
+    for k in range(len(nonNumerics)):
+        vocabulary = encoding['vocabulary'][nonNumerics[k]]
+        vocabulary += [c for c in pd.unique(seasonDF[nonNumerics[k]]) if c not in vocabulary]
+        codes[:, k] = pd.Categorical(seasonDF[nonNumerics[k]], categories=vocabulary).codes
+
+    encoding['codes'] = np.concatenate([encoding['codes'], codes])
+    encoding['numeric'] = np.concatenate([encoding['numeric'],
+                                          seasonDF[encoding['numericNames']].to_numpy(dtype=np.float32)])
+    return encoding
+
+
 def translateRefereeColumn(df, refDict, dictEmpty, filename):
     # in 'Referee' column, replace aliases with true names
     if dictEmpty:
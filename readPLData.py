@@ -3,7 +3,7 @@ This file contains instructions for reading and cleaning Premier League data.
 The data is contained in csv files for each year of the league's existence.
 While the column names do overlap, they are not identical. Older data is much sparser.
 
-I've excluded information from bookmakers.
+I've excluded information from bookmakers here; bookmakerOdds.py reads those columns separately.
 
 fileFromNumber: get file name from season number
 intervalFileList: create list of file names for an (inclusive) interval of season numbers
@@ -46,9 +46,9 @@ def intervalFileList(first, last):
 def getTeams(seasonNumbers):
     teams = dict()
     for season in seasonNumbers:
-        seasonDF = pd.read_csv(fileFromNumber(season))
-        colNames = seasonDF.head()
-        if 'HomeTeam' in colNames:
+        # only the home team column is parsed; a file without one gives a dataframe without columns
+        seasonDF = pd.read_csv(fileFromNumber(season), usecols=lambda column: column == 'HomeTeam')
+        if 'HomeTeam' in seasonDF:
             for teamName in seasonDF['HomeTeam']:
                 if teamName in teams:
                     teams[teamName].add(season)
@@ -0,0 +1,66 @@
+"""
+This file contains methods for keeping processed seasons on disk between runs.
+
+An entry holds everything processData builds from one season file (dataframe, columnar encoding, quarantined rows),
+together with the number of bytes of the file it was built from and a hash of those bytes. During a live season the
+file only grows, so the stored bytes are unchanged and only the lines appended since need processing. An entry built
+with other settings, or by another CACHE_VERSION, is rebuilt.
+
+checkFile: compare season file with its entry: unchanged, appended (with the new lines) or changed
+loadEntry: get stored entry for a season, or None
+storeEntry: save entry for a season
+
+The following are just helper functions:
+    entryFileName
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+CACHE_DIRECTORY = 'cache/seasons'
+CACHE_VERSION = 1           # increase whenever the contents of an entry, or how they are computed, change
+
+
+def checkFile(fileName, entry, settings):
+    # returns status, csv bytes still to process (with header line), size and hash of the whole file
+    with open(fileName, 'rb') as dataFile:
+        data = dataFile.read()
+    fileHash = hashlib.sha256(data).hexdigest()
+
+    if entry is None or entry['settings'] != settings or len(data) < entry['byteSize']:
+        return 'changed', data, len(data), fileHash
+    if len(data) == entry['byteSize']:
+        status = 'unchanged' if fileHash == entry['fileHash'] else 'changed'
+        return status, data if status == 'changed' else b'', len(data), fileHash
+    if hashlib.sha256(data[:entry['byteSize']]).hexdigest() != entry['fileHash']:
+        return 'changed', data, len(data), fileHash
+
+    header = data[:data.find(b'\n') + 1]
+    return 'appended', header + data[entry['byteSize']:], len(data), fileHash
+
+
+def loadEntry(seasonNumber):
+    try:
+        with open(entryFileName(seasonNumber), 'rb') as entryFile:
+            return pickle.load(entryFile)
+    except FileNotFoundError:
+        return None
+
+
+def storeEntry(seasonNumber, entry):
+    # atomic in the same way as experimentCache.storeWindow
+    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+    fileDescriptor, tempName = tempfile.mkstemp(dir=CACHE_DIRECTORY, suffix='.tmp')
+    try:
+        with os.fdopen(fileDescriptor, 'wb') as entryFile:
+            pickle.dump(entry, entryFile)
+        os.replace(tempName, entryFileName(seasonNumber))
+    except BaseException:
+        os.remove(tempName)
+        raise
+
+
+def entryFileName(seasonNumber):
+    return os.path.join(CACHE_DIRECTORY, 'season%02d.pkl' % seasonNumber)
@@ -0,0 +1,122 @@
+"""
+This file contains methods for simulating the final league table from per-fixture predictions.
+
+Each fixture's goal differential is sampled from a normal distribution centred on the predicted goal differential,
+with spread given by the residual error of the model, and rounded to whole goals. Whole seasons are simulated in
+batches as array operations, so no Python loop runs over individual matches.
+
+fixturesFromFrame: get team list and fixture indices from a dataframe of matches, in the order of its rows
+simulateSeasons: sample many seasons, count how often each team finishes in each position
+summarizeSimulation: get title, top-four and relegation odds from position counts
+printSimulation: print summary table
+
+The following are just helper functions:
+    simulateBatch
+    fixtureMatrices
+    rankTeams
+    splitBatches
+"""
+
+import concurrent.futures
+import os
+
+import numpy as np
+import pandas as pd
+
+POINTS_FOR_WIN = 3
+POINTS_FOR_DRAW = 1
+TOP_PLACES = 4
+RELEGATION_PLACES = 3
+BATCH_SIZE = 10000
+PARALLEL_THRESHOLD = 50000      # smaller samples are not worth starting worker processes
+GOAL_DIFF_WEIGHT = 1000         # larger than any possible season goal difference, so points always rank first
+
+
+def fixturesFromFrame(matchDF):
+    # teams are sorted alphabetically; fixtures are given as integer indices into the team list
+    teams, codes = np.unique(np.concatenate([matchDF['HomeTeam'].to_numpy(dtype=str),
+                                             matchDF['AwayTeam'].to_numpy(dtype=str)]), return_inverse=True)
+    numMatches = matchDF.shape[0]
+    return teams.tolist(), codes[:numMatches], codes[numMatches:]
+
+
+def simulateSeasons(homeIdx, awayIdx, numTeams, predictedDiffs, residualStd, numSimulations, seed=None,
+                    numWorkers=None):
+    # returns array whose (i, j) entry counts simulations in which team i finished in position j (0 = champions),
+    # along with average points per team
+    batches = splitBatches(numSimulations)
+    seeds = np.random.SeedSequence(seed).spawn(len(batches))
+    args = [(homeIdx, awayIdx, numTeams, predictedDiffs, residualStd, size, s) for size, s in zip(batches, seeds)]
+
+    if numWorkers is None:
+        numWorkers = os.cpu_count() if numSimulations >= PARALLEL_THRESHOLD else 1
+
+    positionCounts = np.zeros((numTeams, numTeams), dtype=np.int64)
+    pointTotals = np.zeros(numTeams)
+    if numWorkers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=numWorkers) as executor:
+            batchResults = list(executor.map(simulateBatch, *zip(*args)))
+    else:
+        batchResults = [simulateBatch(*a) for a in args]
+    for counts, points in batchResults:
+        positionCounts += counts
+        pointTotals += points
+
+    return positionCounts, pointTotals / numSimulations
+
+
+def summarizeSimulation(teams, positionCounts, meanPoints):
+    numSimulations = positionCounts[0].sum()
+    summary = pd.DataFrame({'Team': teams,
+                            'Points': meanPoints,
+                            'Title': positionCounts[:, 0] / numSimulations,
+                            'Top%d' % TOP_PLACES: positionCounts[:, :TOP_PLACES].sum(axis=1) / numSimulations,
+                            'Relegation': positionCounts[:, -RELEGATION_PLACES:].sum(axis=1) / numSimulations})
+    return summary.sort_values('Points', ascending=False, ignore_index=True)
+
+
+def printSimulation(summary):
+    print(summary.to_string(index=False, float_format=lambda x: '%.3f' % x))
+
+
+def simulateBatch(homeIdx, awayIdx, numTeams, predictedDiffs, residualStd, numSimulations, seedSequence):
+    # simulate numSimulations seasons at once; each row of each array is one season
+    rng = np.random.default_rng(seedSequence)
+    homeMatrix, awayMatrix = fixtureMatrices(homeIdx, awayIdx, numTeams)
+
+    goalDiffs = np.rint(rng.normal(predictedDiffs, residualStd, size=(numSimulations, len(homeIdx))))
+    homePoints = np.where(goalDiffs > 0, POINTS_FOR_WIN, np.where(goalDiffs == 0, POINTS_FOR_DRAW, 0))
+    awayPoints = np.where(goalDiffs < 0, POINTS_FOR_WIN, np.where(goalDiffs == 0, POINTS_FOR_DRAW, 0))
+
+    points = homePoints.astype(np.float32) @ homeMatrix + awayPoints.astype(np.float32) @ awayMatrix
+    goalDifference = goalDiffs.astype(np.float32) @ (homeMatrix - awayMatrix)
+    positions = rankTeams(points, goalDifference, rng)
+
+    flatPositions = np.arange(numTeams) * numTeams + positions
+    counts = np.bincount(flatPositions.ravel(), minlength=numTeams * numTeams).reshape(numTeams, numTeams)
+    return counts, points.sum(axis=0)
+
+
+def fixtureMatrices(homeIdx, awayIdx, numTeams):
+    # (match, team) indicator matrices, so that per-match points times matrix gives per-team totals
+    homeMatrix = np.zeros((len(homeIdx), numTeams), dtype=np.float32)
+    awayMatrix = np.zeros((len(awayIdx), numTeams), dtype=np.float32)
+    homeMatrix[np.arange(len(homeIdx)), homeIdx] = 1
+    awayMatrix[np.arange(len(awayIdx)), awayIdx] = 1
+    return homeMatrix, awayMatrix
+
+
+def rankTeams(points, goalDifference, rng):
+    # order by points, then goal difference; remaining ties (goals scored is not simulated) are drawn by lot
+    sortKey = points.astype(np.float64) * GOAL_DIFF_WEIGHT + goalDifference + rng.random(points.shape)
+    order = np.argsort(-sortKey, axis=1)
+    positions = np.empty_like(order)
+    np.put_along_axis(positions, order, np.arange(points.shape[1]), axis=1)
+    return positions
+
+
+def splitBatches(numSimulations):
+    numBatches = -(-numSimulations // BATCH_SIZE)
+    batches = [BATCH_SIZE] * numBatches
+    batches[-1] = numSimulations - BATCH_SIZE * (numBatches - 1)
+    return batches